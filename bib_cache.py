@@ -0,0 +1,167 @@
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def perceptual_hash(crop):
+    """
+    64-bit DCT perceptual hash of a grayscale image crop. Crops that look
+    the same (small shifts, noise, compression) give hashes a few bits apart,
+    but so can different bibs, so BibCache only uses it to order candidates.
+    """
+    small = cv2.resize(crop, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(small)[:8, :8].flatten()
+    # The DC term only encodes overall brightness; leave it out of the median.
+    bits = low_freq > np.median(low_freq[1:])
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def crop_pattern(crop):
+    """Binarized (0/1) copy of a grayscale crop, used to verify a hash match."""
+    blurred = cv2.GaussianBlur(crop, (3, 3), 0)
+    _, pattern = cv2.threshold(blurred, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return pattern
+
+
+def pattern_difference(a, b, max_shift=4, good_enough=0.0):
+    """
+    How different two crop patterns are, tolerating shifts of up to max_shift
+    pixels. For each shift, the mismatching pixel fraction is taken in
+    windows about half a digit wide and the worst window counts; the best
+    shift wins. A changed digit gives a large mismatch in its window, while
+    the same bib moved a little or with noise only differs along edges.
+    Stops searching once a shift scores good_enough or better.
+    """
+    best = 1.0
+    for dy in range(-max_shift, max_shift + 1):
+        for dx in range(-max_shift, max_shift + 1):
+            ay, ax, by, bx = max(0, dy), max(0, dx), max(0, -dy), max(0, -dx)
+            height = min(a.shape[0] - ay, b.shape[0] - by)
+            width = min(a.shape[1] - ax, b.shape[1] - bx)
+            if height <= 0 or width <= 0:
+                continue
+            mismatch = a[ay:ay + height, ax:ax + width] != b[by:by + height, bx:bx + width]
+            window = max(1, height // 2)
+            column_sums = np.concatenate(([0], np.cumsum(mismatch.sum(axis=0))))
+            starts = np.arange(0, max(1, width - window + 1), max(1, window // 2))
+            ends = np.minimum(starts + window, width)
+            worst = ((column_sums[ends] - column_sums[starts]) / (height * (ends - starts))).max()
+            best = min(best, float(worst))
+            if best <= good_enough:
+                return best
+    return best
+
+
+class BibCache:
+    """
+    Bounded LRU cache of recognition results for detected text crops.
+
+    Entries are keyed on the crop's perceptual hash plus its position on the
+    frame (quantized to cell_pixels). Every entry in the same cell that is
+    younger than max_age_seconds is a candidate, tried closest hash first;
+    the hash alone cannot tell bibs like '005' and '085' apart, nor reliably
+    match the same bib shifted a couple of pixels.
+    A lookup hits when a candidate's crop is about the same size (within
+    max_size_change) and its binarized pattern differs by at most
+    max_difference (see pattern_difference). So a bib held still in front of
+    the camera is only recognized once, while a different bib in the same
+    spot is recognized as new.
+    """
+
+    def __init__(self, max_entries=512, max_age_seconds=2.0, cell_pixels=40,
+                 max_difference=0.05, max_size_change=0.1, max_shift=4):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.cell_pixels = cell_pixels
+        self.max_difference = max_difference
+        self.max_size_change = max_size_change
+        self.max_shift = max_shift
+        self._entries = OrderedDict()  # (cell, hash) -> (text, confidence, stored_at, pattern)
+        self._cells = {}               # cell -> set of keys in _entries
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0  # Candidates turned down by the pattern check
+        self.expired = 0
+        self.evicted = 0
+
+    def _cell(self, box):
+        x_min, x_max, y_min, y_max = box
+        return (int((x_min + x_max) / 2) // self.cell_pixels,
+                int((y_min + y_max) / 2) // self.cell_pixels)
+
+    def _remove(self, key):
+        del self._entries[key]
+        cell_keys = self._cells[key[0]]
+        cell_keys.discard(key)
+        if not cell_keys:
+            del self._cells[key[0]]
+
+    def _same_size(self, a, b):
+        return all(abs(x - y) <= self.max_size_change * max(x, y) + 1 for x, y in zip(a.shape, b.shape))
+
+    def get(self, crop, box, now=None):
+        """
+        Returns the cached (text, confidence) for a grayscale crop taken at
+        box = (x_min, x_max, y_min, y_max), or None on a miss.
+        """
+        now = time.monotonic() if now is None else now
+        crop_hash = perceptual_hash(crop)
+        cell = self._cell(box)
+        candidates = []
+        for key in list(self._cells.get(cell, ())):
+            if now - self._entries[key][2] > self.max_age_seconds:
+                self._remove(key)
+                self.expired += 1
+                continue
+            candidates.append((bin(key[1] ^ crop_hash).count('1'), key))
+
+        pattern = crop_pattern(crop) if candidates else None
+        for _, key in sorted(candidates):
+            text, confidence, _, cached_pattern = self._entries[key]
+            if (self._same_size(pattern, cached_pattern)
+                    and pattern_difference(pattern, cached_pattern, self.max_shift,
+                                           self.max_difference) <= self.max_difference):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return text, confidence
+            self.rejected += 1
+        self.misses += 1
+        return None
+
+    def put(self, crop, box, text, confidence, now=None):
+        """Stores a recognition result, evicting the least recently used entry if full."""
+        now = time.monotonic() if now is None else now
+        key = (self._cell(box), perceptual_hash(crop))
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (text, confidence, now, crop_pattern(crop))
+        self._cells.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evicted += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
+
+    def __str__(self):
+        return (f"Bib cache: {self.hits} hits / {self.misses} misses "
+                f"({self.hit_rate():.0%} of recognitions skipped), "
+                f"{self.rejected} candidates rejected, "
+                f"{len(self._entries)} entries, {self.expired} expired, {self.evicted} evicted")
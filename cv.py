@@ -5,15 +5,38 @@ import numpy as np
 import datetime # Already imported
 import csv
 import os
+import sys
+import collections
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from ts_server_api import lap_run
+from bib_cache import BibCache
+from lap_rollups import LapRollups
 
 # ----------------- Configuration -----------------
 CAMERA_INDEX = 1
+VIDEO_SOURCE = None # Path to a video file to run on instead of a camera
+CAPTURE_BACKEND = 'auto' # 'auto' (by platform), 'avfoundation', 'v4l2', 'dshow', 'msmf' or 'any'
+OCR_INTERVAL_SECONDS = 0 # Minimum time between frames picked for OCR (0 = whenever OCR is free)
 RESOLUTION = '480p'
 FPS = 10
 num_runners_option = 100 # Choose 100 or 200 runners
 visualize_stream = True
 DEBOUNCE_SECONDS = 40
+# OCR worker processes, each with its own recognizer. 0 runs OCR in the main process.
+OCR_WORKERS = 0
+OCR_THREADS_PER_WORKER = 1 # torch threads per worker, so workers don't oversubscribe the cores
+OCR_FRAMES_PER_WORKER = 2  # Frames queued per worker before new frames skip OCR
+OCR_POOL_MAX_RESTARTS = 3  # Broken pools (e.g. a worker killed for memory) replaced before falling back to in-process OCR
+# Reuse recognition results for text crops that look the same as a recent one
+BIB_CACHE_ENABLED = True
+BIB_CACHE_MAX_ENTRIES = 512
+BIB_CACHE_MAX_AGE_SECONDS = 2.0
+BIB_CACHE_MAX_DIFFERENCE = 0.05 # Max mismatching pixel fraction per digit-sized window for a hit
+BIB_CACHE_CELL_PIXELS = 40   # Position grid; a crop only matches entries in its own cell
+BIB_CACHE_REPORT_SECONDS = 60
 
 if RESOLUTION == '2k': FRAME_WIDTH, FRAME_HEIGHT = 2048, 1536
 elif RESOLUTION == '720p': FRAME_WIDTH, FRAME_HEIGHT = 1280, 720
@@ -23,6 +46,7 @@ if num_runners_option == 100: VALID_RACE_NUMBERS = {f"{i:03d}" for i in range(1,
 elif num_runners_option == 200: VALID_RACE_NUMBERS = {f"{i:03d}" for i in range(1, 201)}
 
 CSV_FILE = 'lap_counts.csv'
+ROLLUP_FILE = 'lap_rollups.csv' # Per-minute/10-minute/hour lap buckets for the dashboard charts
 
 # ----------------- Global State -----------------
 # lap_counts tracks display laps (potentially doubled)
@@ -32,7 +56,39 @@ actual_laps = {num: 0 for num in VALID_RACE_NUMBERS}
 last_detection_time = {num: 0 for num in VALID_RACE_NUMBERS}
 
 # ----------------- Initialize OCR Reader -----------------
-reader = easyocr.Reader(['en'], gpu=True)
+# Created on first use so the lap-commit functions can be imported
+# (e.g. by race_sim.py) without loading the OCR model.
+reader = None
+
+def get_reader():
+    """Returns the shared easyocr.Reader, creating it on first call."""
+    global reader
+    if reader is None:
+        reader = easyocr.Reader(['en'], gpu=True)
+    return reader
+
+# Per process, so each OCR worker keeps its own cache.
+bib_cache = None
+last_bib_cache_report = time.time()
+
+def get_bib_cache():
+    """Returns the shared BibCache, creating it on first call."""
+    global bib_cache
+    if bib_cache is None:
+        bib_cache = BibCache(max_entries=BIB_CACHE_MAX_ENTRIES,
+                             max_age_seconds=BIB_CACHE_MAX_AGE_SECONDS,
+                             max_difference=BIB_CACHE_MAX_DIFFERENCE,
+                             cell_pixels=BIB_CACHE_CELL_PIXELS)
+    return bib_cache
+
+lap_rollups = None
+
+def get_lap_rollups():
+    """Returns the shared LapRollups for ROLLUP_FILE, creating it on first call."""
+    global lap_rollups
+    if lap_rollups is None:
+        lap_rollups = LapRollups(ROLLUP_FILE)
+    return lap_rollups
 
 # ----------------- Functions -----------------
 
@@ -129,12 +185,14 @@ def update_csv(lap_counts, actual_laps, csv_file):
         print(f"Error writing to CSV file {csv_file}: {e}")
 # --- End MODIFIED update_csv ---
 
-def append_log_entry(runner_id, display_lap_count, csv_file):
+def append_log_entry(runner_id, display_lap_count, csv_file, timestamp=None):
     """
     Appends a new log entry to the CSV file using the *display* lap count.
     Log section is placed after the scoreboard and a gap of 5 rows.
+    timestamp defaults to the current time ("%Y-%m-%d %H:%M:%S").
     """
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if timestamp is None:
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log_entry = [runner_id, display_lap_count, timestamp]
 
     # Determine expected log header row index (scoreboard rows + 5 blank rows)
@@ -187,53 +245,125 @@ def append_log_entry(runner_id, display_lap_count, csv_file):
         print(f"Error appending log entry to {csv_file}: {e}")
 
 
-# --- MODIFIED process_frame ---
-def process_frame(frame):
+def register_lap(race_number, current_time, current_hour, timestamp=None):
     """
-    Processes a video frame: runs OCR, updates display and actual lap counts
-    (doubling display laps between 2-3 AM), updates CSV, and draws boxes.
+    Commits a detection of race_number as a lap unless it falls inside the
+    debounce window: updates display and actual lap counts (doubling display
+    laps between 2-3 AM), calls the lap API and updates the CSV.
+    timestamp defaults to current_time, formatted for the log and rollups.
+    Returns True if a lap was counted.
     """
     global lap_counts, actual_laps, last_detection_time
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if current_time - last_detection_time[race_number] <= DEBOUNCE_SECONDS:
+        return False
 
-    results = reader.readtext(gray, detail=1)
-    current_time = time.time()
-    # Get current hour (0-23) from system time
-    current_hour = datetime.datetime.now().hour
+    # Determine lap increment based on time
+    if 2 <= current_hour < 3:
+        lap_increment = 2
+        print(f"Power Hour (2-3 AM): Adding 2 laps for {race_number}")
+    else:
+        lap_increment = 1
 
+    # Increment display laps
+    lap_counts[race_number] += lap_increment
+    # ALWAYS increment actual laps by 1
+    actual_laps[race_number] += 1
 
-    for (bbox, text, conf) in results:
-        if conf < 0.5:
+    # Call external API ONCE per detection
+    lap_run(int(race_number))
+
+    last_detection_time[race_number] = current_time
+    print(f"Lap count updated for {race_number}: {lap_counts[race_number]} (Actual: {actual_laps[race_number]})")
+
+    # The log and the rollups both use the capture time, so a lap lands in the same minute in each
+    if timestamp is None:
+        timestamp = datetime.datetime.fromtimestamp(current_time).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Update the CSV file with both counts
+    update_csv(lap_counts, actual_laps, CSV_FILE)
+    # Append a log entry with the *display* lap count
+    append_log_entry(race_number, lap_counts[race_number], CSV_FILE, timestamp)
+
+    # Count the display laps into the dashboard's time-series buckets
+    lap_datetime = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    get_lap_rollups().add_lap(race_number, lap_increment, lap_datetime)
+    return True
+
+
+def recognize_text(gray):
+    """
+    Runs OCR on a grayscale frame and returns readtext-style
+    (bbox, text, conf) results. With BIB_CACHE_ENABLED, text is detected on
+    every frame but only crops that miss the bib cache are recognized.
+    """
+    global last_bib_cache_report
+    ocr = get_reader()
+    if not BIB_CACHE_ENABLED:
+        return ocr.readtext(gray, detail=1)
+
+    cache = get_bib_cache()
+    height, width = gray.shape[:2]
+    horizontal_list, free_list = ocr.detect(gray)
+
+    # (bbox as returned by recognize, (x_min, x_max, y_min, y_max), box to recognize, is_free)
+    boxes = []
+    for box in horizontal_list[0]:
+        # Clip the same way easyocr does, so the returned bbox matches ours
+        x_min, x_max = max(0, box[0]), min(box[1], width)
+        y_min, y_max = max(0, box[2]), min(box[3], height)
+        bbox = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+        boxes.append((bbox, (x_min, x_max, y_min, y_max), [x_min, x_max, y_min, y_max], False))
+    for box in free_list[0]:
+        xs, ys = [p[0] for p in box], [p[1] for p in box]
+        rect = (max(0, int(min(xs))), min(int(max(xs)), width), max(0, int(min(ys))), min(int(max(ys)), height))
+        boxes.append((box, rect, box, True))
+
+    now = time.monotonic()
+    results = [None] * len(boxes)
+    miss_horizontal, miss_free, miss_slots = [], [], {}
+    for slot, (bbox, rect, box, is_free) in enumerate(boxes):
+        x_min, x_max, y_min, y_max = rect
+        crop = gray[y_min:y_max, x_min:x_max]
+        cached = cache.get(crop, rect, now) if crop.size else None
+        if cached is not None:
+            results[slot] = (bbox, cached[0], cached[1])
             continue
+        (miss_free if is_free else miss_horizontal).append(box)
+        miss_slots[str(np.asarray(bbox, dtype=int).tolist())] = (slot, crop, rect)
 
-        text_clean = "".join(filter(str.isdigit, text))
+    if miss_slots:
+        for bbox, text, conf in ocr.recognize(gray, horizontal_list=miss_horizontal,
+                                              free_list=miss_free, detail=1):
+            slot, crop, rect = miss_slots.get(str(np.asarray(bbox, dtype=int).tolist()), (None, None, None))
+            if slot is None:
+                results.append((bbox, text, conf))
+                continue
+            results[slot] = (bbox, text, conf)
+            if crop.size:
+                cache.put(crop, rect, text, conf, now)
 
-        if text_clean in VALID_RACE_NUMBERS:
-            if current_time - last_detection_time[text_clean] > DEBOUNCE_SECONDS:
+    if time.time() - last_bib_cache_report > BIB_CACHE_REPORT_SECONDS:
+        print(cache)
+        last_bib_cache_report = time.time()
 
-                # Determine lap increment based on time
-                if 2 <= current_hour < 3:
-                    lap_increment = 2
-                    print(f"Power Hour (2-3 AM): Adding 2 laps for {text_clean}")
-                else:
-                    lap_increment = 1
+    return [result for result in results if result is not None]
 
-                # Increment display laps
-                lap_counts[text_clean] += lap_increment
-                # ALWAYS increment actual laps by 1
-                actual_laps[text_clean] += 1
 
-                # Call external API ONCE per detection
-                lap_run(int(text_clean))
+def handle_ocr_results(frame, results, current_time, current_hour):
+    """
+    Registers laps for the valid race numbers in the OCR results of frame
+    and draws their boxes. current_time and current_hour must be those of
+    the moment the frame was captured.
+    """
+    for (bbox, text, conf) in results:
+        if conf < 0.5:
+            continue
 
-                last_detection_time[text_clean] = current_time
-                print(f"Lap count updated for {text_clean}: {lap_counts[text_clean]} (Actual: {actual_laps[text_clean]})")
+        text_clean = "".join(filter(str.isdigit, text))
 
-                # Update the CSV file with both counts
-                update_csv(lap_counts, actual_laps, CSV_FILE)
-                # Append a log entry with the *display* lap count
-                append_log_entry(text_clean, lap_counts[text_clean], CSV_FILE)
+        if text_clean in VALID_RACE_NUMBERS:
+            register_lap(text_clean, current_time, current_hour)
 
             # Draw bounding box (unchanged)
             pts = np.array(bbox, np.int32).reshape((-1, 1, 2))
@@ -242,41 +372,289 @@ def process_frame(frame):
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
     return frame
+
+
+# --- MODIFIED process_frame ---
+def process_frame(frame, capture_time=None):
+    """
+    Processes a video frame: runs OCR, registers laps for valid race numbers
+    and draws boxes. capture_time defaults to the time OCR finishes.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    results = recognize_text(gray)
+    current_time = time.time() if capture_time is None else capture_time
+    # Get current hour (0-23) from system time
+    current_hour = datetime.datetime.fromtimestamp(current_time).hour
+
+    return handle_ocr_results(frame, results, current_time, current_hour)
 # --- End MODIFIED process_frame ---
 
 
+# ----------------- OCR Worker Pool -----------------
+def _init_ocr_worker():
+    """Runs once in each worker process: limits torch threads and loads the recognizer."""
+    import torch
+    torch.set_num_threads(OCR_THREADS_PER_WORKER)
+    get_reader()
+
+def _recognize_in_worker(gray):
+    return recognize_text(gray)
+
+def start_ocr_pool(num_workers):
+    """
+    Starts num_workers processes, each holding its own easyocr.Reader.
+    Workers are spawned, not forked: the pool is (re)started while the
+    capture thread is inside OpenCV, and forking a threaded process there
+    can deadlock the child. Spawned workers re-import cv.py, which is cheap
+    since the reader is only created in _init_ocr_worker.
+    """
+    print(f"Starting {num_workers} OCR worker processes...")
+    return ProcessPoolExecutor(max_workers=num_workers, initializer=_init_ocr_worker,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+ocr_pool_restarts = 0
+
+def _ocr_future(pool, gray):
+    """Submits gray to pool, or recognizes it right away when pool is None (in-process fallback)."""
+    if pool is None:
+        future = Future()
+        future.set_result(recognize_text(gray))
+        return future
+    return pool.submit(_recognize_in_worker, gray)
+
+def _is_broken(future):
+    return future.done() and isinstance(future.exception(), BrokenProcessPool)
+
+def restart_ocr_pool(pool, pending):
+    """
+    Replaces a broken pool and resubmits the frames it had not finished, so
+    their laps are not lost. After OCR_POOL_MAX_RESTARTS restarts, returns
+    None and OCR falls back to the main process.
+    """
+    global ocr_pool_restarts
+    pool.shutdown(wait=False)
+    ocr_pool_restarts += 1
+    if ocr_pool_restarts > OCR_POOL_MAX_RESTARTS:
+        print("OCR worker pool keeps breaking; falling back to in-process OCR.")
+        new_pool = None
+    else:
+        print(f"Restarting broken OCR worker pool ({ocr_pool_restarts}/{OCR_POOL_MAX_RESTARTS})...")
+        new_pool = start_ocr_pool(OCR_WORKERS)
+    try:
+        for i, (frame, current_time, current_hour, future) in enumerate(pending):
+            if future.done() and future.exception() is None:
+                continue
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            pending[i] = (frame, current_time, current_hour, _ocr_future(new_pool, gray))
+    except BrokenProcessPool as e:
+        print(f"OCR worker pool broke: {e}")
+        return restart_ocr_pool(new_pool, pending)
+    return new_pool
+
+def check_ocr_pool(pool, pending):
+    """Returns pool, or its replacement if the oldest pending frame failed because the pool broke."""
+    if pool is not None and pending and _is_broken(pending[0][3]):
+        print(f"OCR worker pool broke: {pending[0][3].exception()}")
+        return restart_ocr_pool(pool, pending)
+    return pool
+
+def submit_frame(pool, pending, frame, capture_time=None):
+    """
+    Sends frame to the pool for OCR, stamped with its capture time
+    (default now). pending is a deque kept in capture order.
+    Returns the pool to keep using: a replacement if this one broke, or
+    None once OCR has fallen back to the main process.
+    """
+    current_time = time.time() if capture_time is None else capture_time
+    current_hour = datetime.datetime.fromtimestamp(current_time).hour
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    while True:
+        try:
+            future = _ocr_future(pool, gray)
+            break
+        except BrokenProcessPool as e:
+            print(f"OCR worker pool broke: {e}")
+            pool = restart_ocr_pool(pool, pending)
+    pending.append((frame, current_time, current_hour, future))
+    return pool
+
+def collect_ordered_results(pending, drain=False):
+    """
+    Handles finished OCR results in capture order and returns the processed
+    frames. Stops at the oldest frame still being recognized, so a later frame
+    can never register a lap before an earlier one (keeps debounce and lap
+    order identical to single-process mode). drain=True waits for and handles everything.
+    Also stops at a frame that failed because the pool broke, so
+    check_ocr_pool can resubmit it.
+    """
+    processed_frames = []
+    while pending and (drain or pending[0][3].done()):
+        frame, current_time, current_hour, future = pending[0]
+        try:
+            results = future.result()
+        except BrokenProcessPool:
+            break
+        except Exception as e:
+            print(f"OCR worker failed on frame: {e}")
+            results = []
+        pending.popleft()
+        processed_frames.append(handle_ocr_results(frame, results, current_time, current_hour))
+    return processed_frames
+
+
+def capture_backend():
+    """Returns the cv2 capture API for CAPTURE_BACKEND, choosing one for this platform on 'auto'."""
+    backend = CAPTURE_BACKEND
+    if backend == 'auto':
+        if sys.platform == 'darwin': backend = 'avfoundation'
+        elif sys.platform.startswith('linux'): backend = 'v4l2'
+        elif sys.platform == 'win32': backend = 'dshow'
+        else: backend = 'any'
+    backends = {
+        'avfoundation': cv2.CAP_AVFOUNDATION,
+        'v4l2': cv2.CAP_V4L2,
+        'dshow': cv2.CAP_DSHOW,
+        'msmf': cv2.CAP_MSMF,
+        'any': cv2.CAP_ANY,
+    }
+    return backends[backend]
+
 def try_camera_index(index):
     """Try to open a camera with the given index."""
-    cap = cv2.VideoCapture(index, cv2.CAP_AVFOUNDATION) # Or cv2.CAP_DSHOW etc. depending on OS
+    cap = cv2.VideoCapture(index, capture_backend())
     if cap.isOpened():
-        ret, _ = cap.read()
-        if ret:
+        # grab() is enough to check that frames arrive, no need to decode one
+        if cap.grab():
             print(f"Successfully connected to camera {index}")
             return True, cap
     cap.release()
     return False, None
 
+class CameraFrameSource:
+    """
+    Calls grab() on every camera frame from a background thread, so the
+    driver buffer never holds stale frames and each frame is stamped with
+    the time it was grabbed. Only the frames asked for with next_frame()
+    are decoded with retrieve().
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.condition = threading.Condition()
+        self.not_before = None # Set while next_frame() waits for a frame
+        self.frame = None      # (frame, capture_time) handed to next_frame()
+        self.running = True
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        self.thread = threading.Thread(target=self._grab_frames, daemon=True)
+        self.thread.start()
+
+    def _grab_frames(self):
+        while self.running:
+            if not self.cap.grab():
+                print("Failed to grab frame")
+                break
+            capture_time = time.time()
+            self.frames_grabbed += 1
+            with self.condition:
+                wanted = self.not_before is not None and capture_time >= self.not_before
+            if not wanted:
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                print("Failed to decode frame")
+                break
+            self.frames_decoded += 1
+            with self.condition:
+                self.frame = (frame, capture_time)
+                self.not_before = None
+                self.condition.notify_all()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def next_frame(self, not_before=0):
+        """
+        Decodes the next frame grabbed at or after not_before and returns
+        (frame, capture_time), or None once capture has stopped.
+        """
+        with self.condition:
+            self.not_before = not_before
+            while self.frame is None and self.running:
+                self.condition.wait()
+            captured, self.frame = self.frame, None
+            return captured
+
+    def release(self):
+        self.running = False
+        self.thread.join()
+        self.cap.release()
+
+
+class FileFrameSource:
+    """
+    Reads frames from a video file in order. Frames are stamped with their
+    position in the video (CAP_PROP_POS_MSEC) counted from when the file was
+    opened, so debounce works on video time however fast the file is
+    processed. Frames before not_before are grabbed but not decoded.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.start_time = time.time()
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+
+    def next_frame(self, not_before=0):
+        """Returns the next (frame, capture_time) at or after not_before, or None at the end of the file."""
+        while self.cap.grab():
+            self.frames_grabbed += 1
+            capture_time = self.start_time + self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if capture_time < not_before:
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                print("Failed to decode frame")
+                return None
+            self.frames_decoded += 1
+            return frame, capture_time
+        print("End of video file")
+        return None
+
+    def release(self):
+        self.cap.release()
+
+
 def main():
     # Load existing CSV data (now loading both lap types)
     load_existing_data_from_csv(CSV_FILE)
 
-    # --- Camera setup (unchanged) ---
+    # --- Camera setup ---
     cap = None
     success = False
-    success, cap = try_camera_index(CAMERA_INDEX)
-    if not success:
-        print(f"Could not open camera {CAMERA_INDEX}, trying other indices...")
-        for i in range(4):
-            if i != CAMERA_INDEX:
-                success, cap = try_camera_index(i)
-                if success: break
-    if not success or cap is None:
-        print("Error: Could not open any video capture device")
-        return
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-    cap.set(cv2.CAP_PROP_FPS, FPS)
-    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+    if VIDEO_SOURCE is not None:
+        cap = cv2.VideoCapture(VIDEO_SOURCE)
+        success = cap.isOpened()
+        if not success:
+            print(f"Error: Could not open video file {VIDEO_SOURCE}")
+            return
+    else:
+        success, cap = try_camera_index(CAMERA_INDEX)
+        if not success:
+            print(f"Could not open camera {CAMERA_INDEX}, trying other indices...")
+            for i in range(4):
+                if i != CAMERA_INDEX:
+                    success, cap = try_camera_index(i)
+                    if success: break
+        if not success or cap is None:
+            print("Error: Could not open any video capture device")
+            return
+        # V4L2 only honours the pixel format if it is set before the frame size
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+        cap.set(cv2.CAP_PROP_FPS, FPS)
     print("Camera configuration:")
     print(f"  Actual width:  {cap.get(cv2.CAP_PROP_FRAME_WIDTH)}")
     print(f"  Actual height: {cap.get(cv2.CAP_PROP_FRAME_HEIGHT)}")
@@ -285,21 +663,48 @@ def main():
     time.sleep(2)
     # --- End Camera setup ---
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to grab frame")
-            break
+    source = FileFrameSource(cap) if VIDEO_SOURCE is not None else CameraFrameSource(cap)
+    pool = start_ocr_pool(OCR_WORKERS) if OCR_WORKERS > 0 else None
+    pending = collections.deque()
+    last_ocr_time = 0
 
-        processed_frame = process_frame(frame) # Frame processing now handles double laps
+    while True:
+        pool = check_ocr_pool(pool, pending)
+        processed_frames = []
+        if pool is not None and len(pending) >= OCR_WORKERS * OCR_FRAMES_PER_WORKER:
+            # All workers busy: wait for the oldest frame. A camera source keeps
+            # grabbing meanwhile; a file source just waits, so no frame is dropped.
+            wait([pending[0][3]], timeout=0.05)
+        else:
+            captured = source.next_frame(last_ocr_time + OCR_INTERVAL_SECONDS)
+            if captured is None:
+                break
+            frame, capture_time = captured
+            last_ocr_time = capture_time
+            if pool is None and not pending:
+                processed_frames = [process_frame(frame, capture_time)] # Frame processing now handles double laps
+            else:
+                pool = submit_frame(pool, pending, frame, capture_time)
+        if pending:
+            processed_frames = collect_ordered_results(pending)
 
         if visualize_stream:
-            cv2.imshow("Race Lap Counter", processed_frame)
+            for processed_frame in processed_frames:
+                cv2.imshow("Race Lap Counter", processed_frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-    cap.release()
+    # Frames already captured may still hold laps
+    while pending:
+        pool = check_ocr_pool(pool, pending)
+        collect_ordered_results(pending, drain=True)
+    if pool is not None:
+        pool.shutdown()
+    elif BIB_CACHE_ENABLED:
+        print(get_bib_cache())
+    source.release()
+    print(f"Grabbed {source.frames_grabbed} frames, decoded {source.frames_decoded}.")
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+import csv
+import datetime
+import json
+import os
+
+# Bucket sizes in minutes. Each must divide 60 so buckets line up with the hour.
+TIERS = (1, 10, 60)
+TEAM = 'TOTAL'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+ROLLUP_HEADER = ['Tier Minutes', 'Bucket Start', 'Race Number', 'Laps']
+
+
+def open_bucket_file(rollup_file):
+    """Path of the small JSON file holding the buckets that are still open."""
+    return os.path.splitext(rollup_file)[0] + '_open.json'
+
+
+def bucket_start(when, tier_minutes):
+    """Start of the tier_minutes bucket containing the datetime when."""
+    return when.replace(minute=when.minute // tier_minutes * tier_minutes, second=0, microsecond=0)
+
+
+class LapRollups:
+    """
+    Incremental per-bucket lap counts, maintained by the lap pipeline.
+
+    For every tier, laps are summed per runner and for the team (TEAM) in
+    the bucket currently open. When a lap lands in a later bucket, the
+    finished bucket is appended to rollup_file as one row per runner with
+    laps in it, so the file only ever grows at the end and a reader can
+    pick up just the new rows. Open buckets are kept in a small JSON file,
+    rewritten on each lap, so they survive a restart and the dashboard can
+    show the current minute live.
+    """
+
+    def __init__(self, rollup_file, tiers=TIERS):
+        self.rollup_file = rollup_file
+        self.open_file = open_bucket_file(rollup_file)
+        self.tiers = tiers
+        # tier -> (bucket start, {race number: laps})
+        self.open_buckets = {}
+        if os.path.exists(self.open_file):
+            try:
+                with open(self.open_file) as f:
+                    saved = json.load(f)
+                for tier, bucket in saved.items():
+                    start = datetime.datetime.strptime(bucket['bucket'], TIMESTAMP_FORMAT)
+                    self.open_buckets[int(tier)] = (start, bucket['laps'])
+            except Exception as e:
+                print(f"Could not load open rollup buckets from {self.open_file}: {e}")
+                self.open_buckets = {}
+
+    def add_lap(self, race_number, laps, when):
+        """Counts laps (display laps) for race_number at the datetime when."""
+        closed_rows = []
+        for tier in self.tiers:
+            start = bucket_start(when, tier)
+            current = self.open_buckets.get(tier)
+            if current is None or start > current[0]:
+                if current is not None:
+                    closed_rows.extend(self._rows(tier, *current))
+                current = (start, {})
+                self.open_buckets[tier] = current
+            # A lap older than the open bucket (clock change) is counted in the open bucket.
+            counts = current[1]
+            counts[race_number] = counts.get(race_number, 0) + laps
+            counts[TEAM] = counts.get(TEAM, 0) + laps
+        if closed_rows:
+            self._append_rows(closed_rows)
+        self._save_open()
+
+    @staticmethod
+    def _rows(tier, start, counts):
+        bucket = start.strftime(TIMESTAMP_FORMAT)
+        return [[tier, bucket, number, laps] for number, laps in sorted(counts.items())]
+
+    def _append_rows(self, rows):
+        try:
+            need_header = not os.path.exists(self.rollup_file)
+            with open(self.rollup_file, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if need_header:
+                    writer.writerow(ROLLUP_HEADER)
+                writer.writerows(rows)
+        except Exception as e:
+            print(f"Error appending rollups to {self.rollup_file}: {e}")
+
+    def _save_open(self):
+        saved = {
+            str(tier): {'bucket': start.strftime(TIMESTAMP_FORMAT), 'laps': counts}
+            for tier, (start, counts) in self.open_buckets.items()
+        }
+        try:
+            tmp_file = self.open_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(saved, f)
+            os.replace(tmp_file, self.open_file)
+        except Exception as e:
+            print(f"Error writing open rollup buckets to {self.open_file}: {e}")
+
+
+class RollupReader:
+    """
+    Dashboard side of LapRollups. refresh() only reads the rows appended
+    since the previous call plus the open buckets, and folds them into
+    per-tier series, so a refresh costs the newest buckets no matter how
+    long the race has been running.
+    """
+
+    def __init__(self, rollup_file, tiers=TIERS):
+        self.rollup_file = rollup_file
+        self.open_file = open_bucket_file(rollup_file)
+        self.tiers = tiers
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        # tier -> race number -> [(bucket start, cumulative laps)]
+        self.runner_series = {tier: {} for tier in self.tiers}
+        # tier -> race number -> cumulative laps over closed buckets
+        self.runner_totals = {tier: {} for tier in self.tiers}
+        # tier -> [(bucket start, team laps in bucket)]
+        self.team_series = {tier: [] for tier in self.tiers}
+        # tier -> (bucket start, {race number: laps}) from the open bucket file
+        self.open_buckets = {}
+
+    def refresh(self):
+        """Reads new closed buckets and the current open buckets."""
+        if not os.path.exists(self.rollup_file):
+            if self.offset:
+                self._reset()
+        else:
+            if os.path.getsize(self.rollup_file) < self.offset:
+                # File was replaced (new race), start over
+                self._reset()
+            with open(self.rollup_file, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+            # Leave a half-written last line for the next refresh
+            complete = data[:data.rfind(b'\n') + 1]
+            self.offset += len(complete)
+            for row in csv.reader(complete.decode('utf-8').splitlines()):
+                if len(row) < 4 or row == ROLLUP_HEADER:
+                    continue
+                try:
+                    tier, laps = int(row[0]), int(row[3])
+                    start = datetime.datetime.strptime(row[1], TIMESTAMP_FORMAT)
+                except ValueError:
+                    continue
+                if tier in self.runner_series:
+                    self._add_closed(tier, start, row[2], laps)
+
+        self.open_buckets = {}
+        try:
+            with open(self.open_file) as f:
+                saved = json.load(f)
+            for tier, bucket in saved.items():
+                start = datetime.datetime.strptime(bucket['bucket'], TIMESTAMP_FORMAT)
+                self.open_buckets[int(tier)] = (start, bucket['laps'])
+        except (OSError, ValueError, KeyError):
+            # Missing or mid-replace; the closed buckets are still valid
+            pass
+
+    def _add_closed(self, tier, start, race_number, laps):
+        if race_number == TEAM:
+            self.team_series[tier].append((start, laps))
+            return
+        total = self.runner_totals[tier].get(race_number, 0) + laps
+        self.runner_totals[tier][race_number] = total
+        self.runner_series[tier].setdefault(race_number, []).append((start, total))
+
+    def _open_counts(self, tier):
+        start, counts = self.open_buckets.get(tier, (None, {}))
+        # Skip an open bucket that is already in the closed series
+        if start is not None and self.team_series[tier] and start <= self.team_series[tier][-1][0]:
+            return None, {}
+        return start, counts
+
+    def current_totals(self, tier=TIERS[0]):
+        """Cumulative laps per runner including the open bucket."""
+        totals = dict(self.runner_totals[tier])
+        _, counts = self._open_counts(tier)
+        for number, laps in counts.items():
+            if number != TEAM:
+                totals[number] = totals.get(number, 0) + laps
+        return totals
+
+    def top_runners(self, n, tier=TIERS[0]):
+        totals = self.current_totals(tier)
+        return sorted(totals, key=lambda number: totals[number], reverse=True)[:n]
+
+    def cumulative_series(self, race_numbers, tier):
+        """
+        {race number: [(bucket start, cumulative laps)]} for race_numbers,
+        ending with the open bucket.
+        """
+        start, counts = self._open_counts(tier)
+        series = {}
+        for number in race_numbers:
+            points = list(self.runner_series[tier].get(number, []))
+            if number in counts:
+                total = points[-1][1] if points else 0
+                points.append((start, total + counts[number]))
+            series[number] = points
+        return series
+
+    def team_laps(self, tier):
+        """[(bucket start, team laps in bucket)], ending with the open bucket."""
+        start, counts = self._open_counts(tier)
+        series = list(self.team_series[tier])
+        if TEAM in counts:
+            series.append((start, counts[TEAM]))
+        return series
+
+    def chart_tier(self, max_points):
+        """Finest tier that covers the race so far in at most max_points buckets."""
+        for tier in self.tiers:
+            series = self.team_series[tier]
+            start, _ = self._open_counts(tier)
+            if not series:
+                return tier
+            last = start if start is not None else series[-1][0]
+            span_minutes = (last - series[0][0]).total_seconds() / 60
+            if span_minutes / tier < max_points:
+                return tier
+        return self.tiers[-1]
@@ -0,0 +1,343 @@
+import argparse
+import contextlib
+import csv
+import datetime
+import heapq
+import http.server
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+import cv
+import lap_rollups
+import ts_server_api
+
+# ----------------- Configuration -----------------
+# Named load scenarios. "current" matches the field we race with today,
+# "10x" is the field size we want to know the system survives.
+SCENARIOS = {
+    'current': {'runners': 100},
+    '10x': {'runners': 1000},
+}
+
+SIM_DURATION_MINUTES = 60
+SPEEDUP = 0               # Simulated seconds per wall second, 0 = as fast as possible
+PACE_MEAN_SECONDS = 150   # Mean lap time across the field (one 400 m lap)
+PACE_SD_SECONDS = 35      # Spread of runner mean lap times
+LAP_JITTER = 0.08         # Per-lap variation around a runner's own pace
+MIN_LAP_SECONDS = 70      # Nobody runs a lap faster than this
+DETECTIONS_PER_PASS = 6   # OCR hits per crossing (frames the bib is readable in)
+DETECTION_SPREAD_SECONDS = 1.5
+BURST_INTERVAL_MINUTES = 10   # A pack of runners crosses together this often
+BURST_FRACTION = 0.2          # Share of the field in each pack
+SAMPLE_INTERVAL_SECONDS = 60  # Simulated time between file size / dashboard read samples
+RACE_START = datetime.datetime(2025, 4, 26, 12, 0, 0)
+
+
+# ----------------- Local lap API stand-in -----------------
+class LapApiStandIn(http.server.BaseHTTPRequestHandler):
+    """Answers the two endpoints lap_run uses, counting accepted entries."""
+    entries = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/csrf':
+            self.send_error(404)
+            return
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'csrftoken=simulated; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/new_entry':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        with LapApiStandIn.lock:
+            LapApiStandIn.entries += 1
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_api_stand_in():
+    """Starts the stand-in API on a free local port and returns the server."""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), LapApiStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+# ----------------- Detection stream -----------------
+def generate_detections(num_runners, duration_seconds, seed=None):
+    """
+    Generates a time-ordered list of (sim_time, race_number) OCR detections.
+    Each runner gets a mean pace from a normal distribution and every lap
+    varies around it. Every BURST_INTERVAL_MINUTES a pack of runners is
+    pulled together so they cross the line within a few seconds (only
+    runners who can get there without a lap under MIN_LAP_SECONDS), and each
+    crossing produces DETECTIONS_PER_PASS detections, as when the bib is
+    readable on several consecutive frames.
+    """
+    rng = random.Random(seed)
+    race_numbers = [f"{i:03d}" for i in range(1, num_runners + 1)]
+    paces = {
+        number: max(MIN_LAP_SECONDS, rng.gauss(PACE_MEAN_SECONDS, PACE_SD_SECONDS))
+        for number in race_numbers
+    }
+
+    # Everyone starts together, which is the first crossing burst.
+    crossings = []
+    last_crossing = {number: 0 for number in race_numbers}
+    queue = [(rng.uniform(0, 5) + paces[number], number) for number in race_numbers]
+    heapq.heapify(queue)
+
+    burst_interval = BURST_INTERVAL_MINUTES * 60
+    next_burst = burst_interval
+    while queue:
+        t, number = heapq.heappop(queue)
+        if t > duration_seconds:
+            continue
+        if t >= next_burst:
+            # Pull a pack forward so it crosses right at the burst time.
+            pack_size = int(len(queue) * BURST_FRACTION)
+            pending = [heapq.heappop(queue) for _ in range(len(queue))]
+            rng.shuffle(pending)
+            pack, rest = [], []
+            for entry in pending:
+                burst_time = next_burst + rng.uniform(0, 3)
+                if len(pack) < pack_size and burst_time - last_crossing[entry[1]] >= MIN_LAP_SECONDS:
+                    pack.append((burst_time, entry[1]))
+                else:
+                    rest.append(entry)
+            queue = rest + pack
+            heapq.heapify(queue)
+            heapq.heappush(queue, (t, number))
+            next_burst += burst_interval
+            continue
+        crossings.append((t, number))
+        last_crossing[number] = t
+        lap_time = paces[number] * rng.uniform(1 - LAP_JITTER, 1 + LAP_JITTER)
+        heapq.heappush(queue, (t + max(MIN_LAP_SECONDS, lap_time), number))
+
+    detections = []
+    for t, number in crossings:
+        for _ in range(DETECTIONS_PER_PASS):
+            detections.append((t + rng.uniform(0, DETECTION_SPREAD_SECONDS), number))
+    detections.sort()
+    return race_numbers, detections
+
+
+# ----------------- Measurement -----------------
+def percentile(values, pct):
+    """Nearest-rank percentile of values (pct in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def timed(func, samples):
+    """Wraps func so each call's duration in seconds is appended to samples."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+
+def dashboard_read_cost(csv_file, max_rows):
+    """
+    Times the reads the dashboard side does on every refresh: the scoreboard
+    (header plus one row per runner, max_rows, as visual.py reads it) and a full scan of the
+    file including the log section (as lottery.py reads it).
+    Returns (scoreboard_seconds, full_scan_seconds).
+    """
+    start = time.perf_counter()
+    with open(csv_file, mode='r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row_count, _ in enumerate(reader):
+            if row_count + 1 >= max_rows:
+                break
+    scoreboard_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(csv_file, mode='r', newline='', encoding='utf-8') as f:
+        for _ in csv.reader(f):
+            pass
+    full_scan_seconds = time.perf_counter() - start
+    return scoreboard_seconds, full_scan_seconds
+
+
+def scenario_files(csv_file):
+    """The lap CSV plus the rollup files cv writes next to it during a run."""
+    rollup_file = os.path.splitext(csv_file)[0] + '_rollups.csv'
+    return [csv_file, rollup_file, lap_rollups.open_bucket_file(rollup_file)]
+
+
+def reset_lap_state(race_numbers, csv_file):
+    """
+    Points cv's lap-commit path at a fresh field, CSV file and rollup file.
+    None of the files may exist yet, so a live race file is never touched.
+    """
+    existing = [path for path in scenario_files(csv_file) if os.path.exists(path)]
+    if existing:
+        raise FileExistsError(f"Refusing to overwrite existing file(s): {', '.join(existing)}")
+    cv.VALID_RACE_NUMBERS = set(race_numbers)
+    cv.lap_counts = {num: 0 for num in race_numbers}
+    cv.actual_laps = {num: 0 for num in race_numbers}
+    cv.last_detection_time = {num: 0 for num in race_numbers}
+    cv.CSV_FILE = csv_file
+    cv.ROLLUP_FILE = scenario_files(csv_file)[1]
+    cv.lap_rollups = None
+    cv.update_csv(cv.lap_counts, cv.actual_laps, csv_file)
+
+
+# ----------------- Simulation -----------------
+def run_scenario(name, num_runners, duration_minutes, speedup, use_api, seed, csv_file):
+    """Drives a generated detection stream through cv.register_lap and prints a report."""
+    duration_seconds = duration_minutes * 60
+    race_numbers, detections = generate_detections(num_runners, duration_seconds, seed)
+    # cv prints a line per CSV write; keep the report readable.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        reset_lap_state(race_numbers, csv_file)
+
+    stage_samples = {'update_csv': [], 'append_log_entry': [], 'lap_run': []}
+    originals = {stage: getattr(cv, stage) for stage in stage_samples}
+    for stage, samples in stage_samples.items():
+        setattr(cv, stage, timed(originals[stage], samples))
+    if not use_api:
+        cv.lap_run = timed(lambda runner: '', stage_samples['lap_run'])
+
+    server = None
+    if use_api:
+        server = start_api_stand_in()
+        ts_server_api.API_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+    commit_latencies = []
+    file_samples = []  # (sim_seconds, file_bytes, scoreboard_read_s, full_scan_s)
+    rollup_reader = lap_rollups.RollupReader(cv.ROLLUP_FILE)
+    rollup_refresh_samples = []
+    next_sample = 0
+    sampling_seconds = 0.0  # Wall time spent on the samples, kept out of the throughput
+    laps = 0
+
+    print(f"\n=== Scenario '{name}': {num_runners} runners, {duration_minutes} simulated minutes, "
+          f"{len(detections)} detections ===")
+    wall_start = time.perf_counter()
+    try:
+        # cv prints a line per CSV write; keep the report readable.
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for sim_time, number in detections:
+                if speedup > 0:
+                    delay = wall_start + sim_time / speedup - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                sample_start = time.perf_counter()
+                while sim_time >= next_sample:
+                    file_samples.append((next_sample, os.path.getsize(csv_file),
+                                         *dashboard_read_cost(csv_file, num_runners)))
+                    timed(rollup_reader.refresh, rollup_refresh_samples)()
+                    next_sample += SAMPLE_INTERVAL_SECONDS
+                sampling_seconds += time.perf_counter() - sample_start
+
+                sim_now = RACE_START + datetime.timedelta(seconds=sim_time)
+                start = time.perf_counter()
+                # Offset by 1 s so the first crossing is never inside the debounce window.
+                committed = cv.register_lap(number, sim_time + cv.DEBOUNCE_SECONDS + 1, sim_now.hour,
+                                            sim_now.strftime("%Y-%m-%d %H:%M:%S"))
+                if committed:
+                    commit_latencies.append(time.perf_counter() - start)
+                    laps += 1
+        sample_start = time.perf_counter()
+        file_samples.append((duration_seconds, os.path.getsize(csv_file), *dashboard_read_cost(csv_file, num_runners)))
+        sampling_seconds += time.perf_counter() - sample_start
+    finally:
+        for stage, func in originals.items():
+            setattr(cv, stage, func)
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    wall_elapsed = time.perf_counter() - wall_start
+    commit_elapsed = wall_elapsed - sampling_seconds
+
+    print(f"Laps committed:        {laps} ({len(detections) - laps} detections debounced)")
+    if server is not None:
+        print(f"API entries received:  {LapApiStandIn.entries}")
+        LapApiStandIn.entries = 0
+    print(f"Wall time:             {wall_elapsed:.2f} s ({sampling_seconds:.2f} s of it taking dashboard samples)")
+    print(f"Sustained throughput:  {laps / commit_elapsed:.1f} laps/s "
+          f"(race needs {laps / duration_seconds:.2f} laps/s)")
+    print("Commit latency (ms):   p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}".format(
+        *(1000 * percentile(commit_latencies, p) for p in (50, 95, 99, 100))))
+    for stage, samples in stage_samples.items():
+        if samples:
+            print(f"  {stage:<18} mean {1000 * statistics.mean(samples):.2f} ms  "
+                  f"p99 {1000 * percentile(samples, 99):.2f} ms")
+
+    first, last = file_samples[0], file_samples[-1]
+    hours = max(duration_seconds / 3600, 1e-9)
+    print(f"CSV size:              {first[1] / 1024:.1f} KiB -> {last[1] / 1024:.1f} KiB "
+          f"({(last[1] - first[1]) / 1024 / hours:.1f} KiB/hour)")
+    print(f"Dashboard read (ms):   scoreboard {1000 * first[2]:.2f} -> {1000 * last[2]:.2f}, "
+          f"full scan {1000 * first[3]:.2f} -> {1000 * last[3]:.2f}")
+    if rollup_refresh_samples:
+        print(f"Rollup refresh (ms):   first {1000 * rollup_refresh_samples[0]:.2f}, "
+              f"last {1000 * rollup_refresh_samples[-1]:.2f}, "
+              f"p99 {1000 * percentile(rollup_refresh_samples, 99):.2f}")
+    return laps / commit_elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the lap storage and delivery path with a synthetic race.")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS) + ['all'], default='all')
+    parser.add_argument('--runners', type=int, help="Override the scenario's runner count")
+    parser.add_argument('--minutes', type=float, default=SIM_DURATION_MINUTES, help="Simulated race length")
+    parser.add_argument('--speedup', type=float, default=SPEEDUP,
+                        help="Simulated seconds per wall second (0 = as fast as possible)")
+    parser.add_argument('--no-api', action='store_true', help="Skip lap_run instead of using the local stand-in")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--csv', help="New CSV file to write, must not exist yet (default: a temporary file); "
+                                      "with several scenarios the scenario name is appended")
+    args = parser.parse_args()
+
+    names = sorted(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_files = {}
+        for name in names:
+            if args.csv is None:
+                csv_files[name] = os.path.join(tmp_dir, f"lap_counts_{name}.csv")
+            elif len(names) == 1:
+                csv_files[name] = args.csv
+            else:
+                base, ext = os.path.splitext(args.csv)
+                csv_files[name] = f"{base}_{name}{ext}"
+        existing = [path for csv_file in csv_files.values() for path in scenario_files(csv_file) if os.path.exists(path)]
+        if existing:
+            parser.error(f"refusing to overwrite existing file(s): {', '.join(existing)}")
+
+        for name in names:
+            num_runners = args.runners or SCENARIOS[name]['runners']
+            csv_file = csv_files[name]
+            run_scenario(name, num_runners, args.minutes, args.speedup, not args.no_api, args.seed, csv_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import itertools
+
+import cv2
+import numpy as np
+import pytest
+
+from bib_cache import BibCache
+
+BIBS = [f"{i:03d}" for i in range(1, 101)]
+BOX = (100, 220, 200, 240)  # (x_min, x_max, y_min, y_max) on the frame
+
+
+def render_bib(text, dx=0, dy=0, noise=0, pad=(4, 4, 4, 4), seed=0):
+    """Renders a bib number and crops it tightly, like a detected text box."""
+    def draw(offset_x, offset_y):
+        img = np.full((80, 180), 255, np.uint8)
+        cv2.putText(img, text, (20 + offset_x, 55 + offset_y), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3)
+        return img
+
+    img = draw(dx, dy)
+    if noise:
+        rng = np.random.default_rng(seed)
+        img = np.clip(img + rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+    ys, xs = np.where(draw(dx, dy) < 128)
+    top, bottom, left, right = pad
+    return img[ys.min() - top:ys.max() + bottom, xs.min() - left:xs.max() + right]
+
+
+@pytest.fixture(scope="module")
+def crops():
+    return {bib: render_bib(bib) for bib in BIBS}
+
+
+def test_distinct_bibs_never_hit(crops):
+    for cached, looked_up in itertools.permutations(BIBS, 2):
+        cache = BibCache()
+        cache.put(crops[cached], BOX, cached, 0.9, now=0)
+        assert cache.get(crops[looked_up], BOX, now=1) is None, (cached, looked_up)
+
+
+@pytest.mark.parametrize("dx, dy, pad", [
+    (2, 0, (5, 3, 4, 6)),
+    (-2, 1, (3, 4, 5, 4)),
+    (1, -2, (4, 4, 3, 3)),
+    (2, 2, (6, 5, 6, 5)),
+])
+def test_jittered_same_bib_hits(crops, dx, dy, pad):
+    for seed, bib in enumerate(BIBS):
+        cache = BibCache()
+        cache.put(crops[bib], BOX, bib, 0.9, now=0)
+        jittered = render_bib(bib, dx, dy, noise=8, pad=pad, seed=seed)
+        assert cache.get(jittered, BOX, now=1) == (bib, 0.9), bib
+
+
+def test_entries_expire_and_stay_in_their_cell(crops):
+    cache = BibCache(max_age_seconds=2.0)
+    cache.put(crops["005"], BOX, "005", 0.9, now=0)
+    assert cache.get(crops["005"], (400, 520, 200, 240), now=1) is None
+    assert cache.get(crops["005"], BOX, now=3) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(crops):
+    cache = BibCache(max_entries=2)
+    cache.put(crops["001"], (0, 120, 0, 40), "001", 0.9, now=0)
+    cache.put(crops["002"], (200, 320, 0, 40), "002", 0.9, now=0)
+    assert cache.get(crops["001"], (0, 120, 0, 40), now=1) is not None
+    cache.put(crops["003"], (400, 520, 0, 40), "003", 0.9, now=1)
+    assert cache.get(crops["002"], (200, 320, 0, 40), now=1) is None
+    assert cache.get(crops["001"], (0, 120, 0, 40), now=1) == ("001", 0.9)
+    assert cache.stats()["evicted"] == 1
@@ -1,15 +1,20 @@
 import requests
 
+import os
 import time
 
+# Base URL of the lap API. Override with LAP_API_URL (or by assigning this
+# attribute) to point lap_run at another server, e.g. race_sim.py's stand-in.
+API_BASE_URL = os.environ.get("LAP_API_URL", "https://goldfish-app-auqrj.ondigitalocean.app")
+
 def current_milli_time():
     return round(time.time() * 1000)
 
 def lap_run(runner : int):
     session = requests.Session()
-    data = session.get("https://goldfish-app-auqrj.ondigitalocean.app/csrf/")
+    data = session.get(f"{API_BASE_URL}/csrf/")
 
     session.headers.update({"X-CSRFToken": data.cookies["csrftoken"]})
-    data = session.post("https://goldfish-app-auqrj.ondigitalocean.app/new_entry/", data={"time": current_milli_time(), "runner": runner})
+    data = session.post(f"{API_BASE_URL}/new_entry/", data={"time": current_milli_time(), "runner": runner})
 
     return data.text
\ No newline at end of file
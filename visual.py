@@ -4,12 +4,15 @@ import pandas as pd
 import numpy as np
 from streamlit_autorefresh import st_autorefresh
 from datetime import datetime # Already imported
+from lap_rollups import RollupReader
 # Assuming cv.py or similar defines this
 # from cv import num_runners_option
 # For testing, let's define it here:
 num_runners_option = 100 # Or 200
 
 update_interval = 1000    # milliseconds
+top_n_chart = 5           # Runners in the cumulative laps chart
+max_chart_points = 180    # Coarser rollup tiers are used once the race is longer than this many buckets
 
 st.set_page_config(page_title="DTU Thunderstriders Knækker Cancer - Lap Counts", layout="wide")
 
@@ -31,6 +34,12 @@ if "new_runners" not in st.session_state:
     st.session_state.new_runners = []
 
 CSV_FILE = 'lap_counts.csv'
+ROLLUP_FILE = 'lap_rollups.csv'
+
+# The reader keeps its file position and series between refreshes,
+# so each refresh only reads the rollup buckets closed since the last one.
+if "lap_rollups" not in st.session_state:
+    st.session_state.lap_rollups = RollupReader(ROLLUP_FILE)
 
 # --- MODIFIED load_scoreboard_from_csv function ---
 def load_scoreboard_from_csv(csv_file, max_rows=num_runners_option):
@@ -244,4 +253,28 @@ else:
     # Display empty columns
     cols = st.columns(num_columns)
     for col in cols:
-        col.empty()
\ No newline at end of file
+        col.empty()
+
+
+# --- Live charts from the lap rollups ---
+rollups = st.session_state.lap_rollups
+rollups.refresh()
+
+chart_cols = st.columns(2)
+
+chart_tier = rollups.chart_tier(max_chart_points)
+top_runners = rollups.top_runners(top_n_chart)
+cumulative = rollups.cumulative_series(top_runners, chart_tier)
+if any(cumulative.values()):
+    cumulative_df = pd.concat(
+        [pd.Series(dict(points), name=number) for number, points in cumulative.items() if points],
+        axis=1,
+    ).sort_index().ffill().fillna(0)
+    chart_cols[0].markdown(f"<h3>Top {top_n_chart} cumulative laps ({chart_tier} min buckets)</h3>", unsafe_allow_html=True)
+    chart_cols[0].line_chart(cumulative_df)
+
+hourly = rollups.team_laps(60)
+if hourly:
+    hourly_df = pd.DataFrame(hourly, columns=["Hour", "Laps"])
+    chart_cols[1].markdown("<h3>Team laps per hour</h3>", unsafe_allow_html=True)
+    chart_cols[1].bar_chart(hourly_df.set_index("Hour"))